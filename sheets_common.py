@@ -0,0 +1,145 @@
+# sheets_common.py
+# Acceso a Google Sheets compartido por los scripts de sync (Etsy,
+# Vinted, Wallapop): auth perezosa con caché de token en disco y la
+# escritura cabecera+datos+limpieza en un solo batchUpdate. Antes cada
+# script llevaba su propia copia de esta lógica.
+import functools
+import hashlib
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import gspread
+import orjson
+from google.oauth2.service_account import Credentials
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+# Cache del bearer token en disco: el intercambio JWT con Google cuesta
+# ~300 ms de HTTPS+crypto por arranque; mientras el token cacheado no
+# expire lo reutilizamos y gspread no vuelve a negociar. El fichero va
+# keyeado por un hash de la service account: rotar GOOGLE_SA_JSON nunca
+# reutiliza el bearer de la cuenta (o clave) anterior.
+def _token_cache_path(sa_json: str) -> str:
+    digest = hashlib.sha256(sa_json.encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f".gsheets_token.{digest}.json")
+
+def _load_cached_token(creds, path: str):
+    try:
+        with open(path, "rb") as f:
+            tok = orjson.loads(f.read())
+        expiry = datetime.fromisoformat(tok["expiry"])
+        # margen de 5 min para no pillar un token a punto de caducar
+        if expiry - datetime.now(timezone.utc) > timedelta(minutes=5):
+            creds.token = tok["token"]
+            creds.expiry = expiry.replace(tzinfo=None)  # google-auth usa UTC naive
+    except Exception:
+        pass
+
+def _save_cached_token(creds, path: str):
+    try:
+        if creds.token and creds.expiry:
+            payload = orjson.dumps({
+                "token": creds.token,
+                "expiry": creds.expiry.replace(tzinfo=timezone.utc).isoformat(),
+            })
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+    except Exception:
+        pass
+
+@functools.lru_cache(maxsize=None)
+def _credentials(sa_json: str):
+    creds = Credentials.from_service_account_info(
+        orjson.loads(sa_json), scopes=SCOPES
+    )
+    _load_cached_token(creds, _token_cache_path(sa_json))
+    return creds
+
+@functools.lru_cache(maxsize=None)
+def _client(sa_json: str):
+    return gspread.authorize(_credentials(sa_json))
+
+def open_worksheet(sa_json: str, sheet_id: str, tab: str, *,
+                   rows: int = 2000, cols: int = 20):
+    """Abre (o crea) la pestaña. El cliente autorizado se cachea por
+    credenciales, así que llamadas repetidas no repiten el OAuth."""
+    sh = _client(sa_json).open_by_key(sheet_id)
+    try:
+        ws = sh.worksheet(tab)
+    except gspread.exceptions.WorksheetNotFound:
+        # crea con margen por si añades columnas propias a la derecha
+        ws = sh.add_worksheet(title=tab, rows=rows, cols=cols)
+    # Tras la primera petición google-auth ya negoció (o refrescó) el
+    # bearer: persistirlo aquí cubre a todos los scripts sin que cada
+    # uno tenga que acordarse de llamar a save_token_cache
+    save_token_cache(sa_json)
+    return ws
+
+def save_token_cache(sa_json: str):
+    """Persiste el bearer actual para el próximo arranque."""
+    _save_cached_token(_credentials(sa_json), _token_cache_path(sa_json))
+
+def _as_text(x) -> str:
+    if x is None:
+        return ""
+    return str(x)
+
+def _cell_rows(values):
+    return [
+        {"values": [{"userEnteredValue": {"stringValue": _as_text(v)}} for v in row]}
+        for row in values
+    ]
+
+def write_block(ws, headers, rows):
+    """
+    Escribe cabeceras + datos, amplía filas si hace falta y limpia las
+    sobrantes de runs anteriores, todo en UN solo spreadsheets.batchUpdate
+    (updateSheetProperties + updateCells): un único round trip a la API
+    aunque la hoja tenga que crecer.
+    - No borra toda la hoja: solo toca el bloque de nuestras columnas.
+    - No encoge filas: encoger borraría las columnas propias del usuario
+      a la derecha de nuestro bloque; las sobrantes se blanquean.
+    """
+    ncols = len(headers)
+    old_rows = ws.row_count
+    reqs = []
+
+    if len(rows) + 1 > old_rows:
+        reqs.append({
+            "updateSheetProperties": {
+                "properties": {"sheetId": ws.id,
+                               "gridProperties": {"rowCount": len(rows) + 1}},
+                "fields": "gridProperties.rowCount",
+            }
+        })
+
+    reqs.append({
+        "updateCells": {
+            "rows": _cell_rows([headers] + rows),
+            "fields": "userEnteredValue",
+            "start": {"sheetId": ws.id, "rowIndex": 0, "columnIndex": 0},
+        }
+    })
+
+    # Borra lo que quedara de un run anterior más largo: repeatCell sin
+    # cell con fields=userEnteredValue limpia el rango en el servidor con
+    # una request de tamaño constante, en vez de mandar stale×ncols
+    # celdas vacías serializadas en el JSON
+    stale = old_rows - (len(rows) + 1)
+    if stale > 0:
+        reqs.append({
+            "repeatCell": {
+                "range": {
+                    "sheetId": ws.id,
+                    "startRowIndex": len(rows) + 1,
+                    "endRowIndex": old_rows,
+                    "startColumnIndex": 0,
+                    "endColumnIndex": ncols,
+                },
+                "fields": "userEnteredValue",
+            }
+        })
+
+    ws.spreadsheet.batch_update({"requests": reqs})
@@ -1,10 +1,14 @@
 # sync_etsy_to_sheets.py
-import os, re, json, time, requests
+import importlib.util
+import os, random, re, time, requests
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timezone
 from typing import Tuple, List, Dict, Any
 
-import gspread
-from google.oauth2.service_account import Credentials
+from sheets_common import open_worksheet, write_block
 
 # ---------- Helpers genéricos ----------
 def as_text(x) -> str:
@@ -12,13 +16,6 @@ def as_text(x) -> str:
         return ""
     return str(x)
 
-def _col_letter(n: int) -> str:
-    s = ""
-    while n:
-        n, r = divmod(n - 1, 26)
-        s = chr(65 + r) + s
-    return s
-
 # ---------- Config ----------
 SHEET_ID       = os.getenv("SHEET_ID")
 SHEET_TAB      = os.getenv("SHEET_TAB_ETSY", "etsy_items")
@@ -34,61 +31,51 @@ if not (SHEET_ID and GOOGLE_SA_JSON and ETSY_CLIENT_ID and ETSY_REFRESH_TOKEN):
     raise SystemExit("Faltan variables: SHEET_ID, GOOGLE_SA_JSON, ETSY_CLIENT_ID o ETSY_REFRESH_TOKEN")
 
 # ---------- Google Sheets ----------
-creds = Credentials.from_service_account_info(
-    json.loads(GOOGLE_SA_JSON),
-    scopes=["https://www.googleapis.com/auth/spreadsheets"]
-)
-gc = gspread.authorize(creds)
-sh = gc.open_by_key(SHEET_ID)
-try:
-    ws = sh.worksheet(SHEET_TAB)
-except gspread.exceptions.WorksheetNotFound:
-    ws = sh.add_worksheet(title=SHEET_TAB, rows=2000, cols=20)
+def _ws():
+    return open_worksheet(GOOGLE_SA_JSON, SHEET_ID, SHEET_TAB)
 
 HEADERS = [
     "id","title","price","currency","url","state",
     "tags","description","shop_name","shop_url","timestamp_utc"
 ]
 
-def write_headers_and_clear_data_block():
-    """
-    - No borra toda la hoja.
-    - Mantiene la fila 1 (cabeceras).
-    - Limpia solo A2..(end_col,last_row) donde escribimos nuestros datos.
-    """
-    end_col = _col_letter(len(HEADERS))
-    last_row = max(2, ws.row_count)
-
-    # Reescribe cabeceras (argumentos nombrados para evitar DeprecationWarning)
-    ws.update(values=[HEADERS], range_name="A1")
-
-    rng = f"A2:{end_col}{last_row}"
-    try:
-        # batch_clear es método del Spreadsheet
-        ws.spreadsheet.batch_clear([rng])
-    except Exception:
-        # Fallback: sobreescribe con vacío
-        empty_rows = last_row - 1
-        if empty_rows > 0:
-            ws.update(
-                values=[[""] * len(HEADERS) for _ in range(empty_rows)],
-                range_name=rng,
-                value_input_option="RAW",
-            )
-
-def write_rows(rows: List[List[str]]):
-    if not rows:
-        return
-    need = len(rows) - (ws.row_count - 1)
-    if need > 0:
-        ws.add_rows(need)
-    end_col = _col_letter(len(HEADERS))
-    ws.update(values=rows, range_name=f"A2:{end_col}{len(rows)+1}")
+def write_all(rows: List[List[str]]):
+    # Cabecera + datos + limpieza del bloque en un solo batchUpdate;
+    # la lógica vive en sheets_common, compartida con los otros syncs
+    write_block(_ws(), HEADERS, rows)
 
 # ---------- Etsy API helpers ----------
 API_BASE = "https://api.etsy.com/v3"
 
-def oauth_refresh() -> str:
+def make_session() -> requests.Session:
+    """
+    Una única sesión para todo el script: reutiliza la conexión TLS
+    (keep-alive) entre el refresh OAuth, la resolución de la tienda y
+    la paginación de listings, en vez de renegociar por petición.
+    Los reintentos los gestiona urllib3: backoff exponencial y, en un
+    429, respeta el Retry-After que mande Etsy en vez de un sleep fijo.
+    """
+    retry = Retry(
+        total=4,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503],
+        allowed_methods={"GET"},
+        respect_retry_after_header=True,
+    )
+    sess = requests.Session()
+    # Acepta también Brotli (~5x menos bytes que sin comprimir en JSON);
+    # urllib3 descomprime inline y r.content ya llega descomprimido.
+    # Solo se anuncia 'br' si el paquete brotli está instalado: sin él
+    # urllib3 no puede descomprimir y orjson.loads recibiría el body
+    # comprimido tal cual.
+    if importlib.util.find_spec("brotli"):
+        sess.headers.update({"Accept-Encoding": "gzip, br, deflate"})
+    else:
+        sess.headers.update({"Accept-Encoding": "gzip, deflate"})
+    sess.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry))
+    return sess
+
+def oauth_refresh(sess: requests.Session) -> str:
     """
     Intercambia el refresh token por un access token.
     Etsy devuelve access_token con formato "<user_id>.<token>".
@@ -99,10 +86,10 @@ def oauth_refresh() -> str:
         "client_id": ETSY_CLIENT_ID,
         "refresh_token": ETSY_REFRESH_TOKEN,
     }
-    r = requests.post(url, json=body, timeout=30)
+    r = sess.post(url, json=body, timeout=30)
     if not r.ok:
         raise SystemExit(f"OAuth refresh failed: {r.status_code} {r.text}")
-    data = r.json()
+    data = orjson.loads(r.content)
     return as_text(data.get("access_token"))
 
 def auth_headers(access_token: str) -> Dict[str, str]:
@@ -111,24 +98,32 @@ def auth_headers(access_token: str) -> Dict[str, str]:
         "Authorization": f"Bearer {access_token}",
     }
 
+# Compilada a nivel de módulo: evita el lookup en re._cache por llamada
+_SHOP_NAME_RE = re.compile(r"/shop/([^/?#]+)")
+
 def shop_name_from_url(url: str) -> str:
-    if not url: 
+    if not url:
         return ""
-    m = re.search(r"/shop/([^/?#]+)", url)
+    m = _SHOP_NAME_RE.search(url)
     return m.group(1) if m else ""
 
-def resolve_shop_id(access_token: str) -> Tuple[str, str]:
+def resolve_shop_id(sess: requests.Session, access_token: str) -> Tuple[str, str]:
     """Devuelve (shop_id, shop_name). Acepta SHOP_ID o SHOP_NAME o PROFILE_URL."""
     if ETSY_SHOP_ID:
+        # Si el nombre ya viene por env o por la URL del perfil, no hace
+        # falta ninguna petición: ahorramos un round trip HTTPS completo
+        name = ETSY_SHOP_NAME or shop_name_from_url(ETSY_PROFILE_URL)
+        if name:
+            return ETSY_SHOP_ID, name
         # Si dan el ID, intentamos recuperar nombre
         try:
-            r = requests.get(
+            r = sess.get(
                 f"{API_BASE}/application/shops/{ETSY_SHOP_ID}",
                 headers=auth_headers(access_token), timeout=30
             )
             name = ""
             if r.ok:
-                sj = r.json() or {}
+                sj = orjson.loads(r.content) or {}
                 name = as_text(sj.get("shop_name") or sj.get("shop_name_full") or "")
             return ETSY_SHOP_ID, name
         except Exception:
@@ -140,11 +135,11 @@ def resolve_shop_id(access_token: str) -> Tuple[str, str]:
 
     # Búsqueda por nombre
     url = f"{API_BASE}/application/shops?shop_name={name}"
-    r = requests.get(url, headers=auth_headers(access_token), timeout=30)
+    r = sess.get(url, headers=auth_headers(access_token), timeout=30)
     if not r.ok:
         raise SystemExit(f"No pude resolver shop_id para '{name}': {r.status_code} {r.text}")
 
-    data = r.json() or {}
+    data = orjson.loads(r.content) or {}
     shop = None
     for key in ("results","shops","data"):
         if isinstance(data.get(key), list) and data[key]:
@@ -157,38 +152,76 @@ def resolve_shop_id(access_token: str) -> Tuple[str, str]:
 
     return as_text(shop["shop_id"]), as_text(shop.get("shop_name", name))
 
-def fetch_active_listings(access_token: str, shop_id: str) -> List[Dict[str, Any]]:
+def _fetch_listings_page(sess, headers: Dict[str, str], base: str,
+                         limit: int, offset: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    # Jitter corto por petición: desincroniza los hilos del pool para no
+    # disparar 5 GETs en el mismo milisegundo contra el rate limit
+    time.sleep(random.uniform(0.05, 0.15))
+    r = sess.get(f"{base}?limit={limit}&offset={offset}", headers=headers, timeout=30)
+    if not r.ok:
+        raise SystemExit(f"Error en listings: {r.status_code} {r.text}")
+    payload = orjson.loads(r.content) or {}
+    results = payload.get("results") or payload.get("listings") or payload.get("data") or []
+    if not isinstance(results, list):
+        results = []
+    return payload, results
+
+def fetch_active_rows(sess: requests.Session, access_token: str, shop_id: str,
+                      shop_name: str, shop_url: str) -> List[List[str]]:
     """
-    Pagina por todas las publicaciones activas.
+    Pagina por todas las publicaciones activas y devuelve las filas ya
+    normalizadas. Normalizar página a página evita retener en memoria
+    los dicts crudos de la API (photos, variantes, etc. que no usamos):
+    el pico de RSS queda en ~una página, no en el catálogo entero.
+    Lee 'count' en la primera página y baja el resto de páginas en
+    paralelo (pocos hilos sobre una sesión keep-alive compartida), en
+    vez de una a una con sleep: el total de espera pasa de N×RTT a ~RTT.
     Maneja 'count' + 'results' / 'listings' / 'data'.
     """
-    all_items: List[Dict[str, Any]] = []
-    limit, offset = 100, 0
+    headers = auth_headers(access_token)
     base = f"{API_BASE}/application/shops/{shop_id}/listings/active"
-    while True:
-        url = f"{base}?limit={limit}&offset={offset}"
-        r = requests.get(url, headers=auth_headers(access_token), timeout=30)
-        if not r.ok:
-            raise SystemExit(f"Error en listings: {r.status_code} {r.text}")
-
-        payload = r.json() or {}
-        results = payload.get("results") or payload.get("listings") or payload.get("data") or []
-        if not isinstance(results, list):
-            results = []
-
-        all_items.extend(results)
-
-        total = payload.get("count")
-        # Si 'count' no viene, paramos cuando la página trae menos que limit
-        if total is None and len(results) < limit:
-            break
-
-        offset += limit
-        if total is not None and len(all_items) >= int(total):
-            break
-
-        time.sleep(0.2)
-    return all_items
+    limit = 100
+
+    seen: set = set()
+
+    def _page_rows(offset: int) -> Tuple[Dict[str, Any], List[List[str]], int]:
+        payload, results = _fetch_listings_page(sess, headers, base, limit, offset)
+        page_rows: List[List[str]] = []
+        for li in results:
+            # Descarta duplicados (solapes entre páginas) ANTES de
+            # normalizar, así no pagamos normalize_row por filas que tiramos
+            lid = as_text(li.get("listing_id") or li.get("listingId") or li.get("id") or "")
+            if lid:
+                if lid in seen:
+                    continue
+                seen.add(lid)
+            page_rows.append(normalize_row(li, shop_name, shop_url))
+        return payload, page_rows, len(results)
+
+    payload, page, raw_len = _page_rows(0)
+    rows: List[List[str]] = page
+    total = payload.get("count")
+
+    if total is None:
+        # Sin 'count' (metadatos no fiables): secuencial, parando cuando
+        # la página venga corta EN CRUDO (no tras dedupe, que acortaría
+        # la página y cortaría la paginación antes de tiempo)
+        offset = limit
+        while raw_len == limit:
+            time.sleep(0.2)
+            _, page, raw_len = _page_rows(offset)
+            rows.extend(page)
+            offset += limit
+        return rows
+
+    # Con 'count' el número de páginas es exacto: ni una llamada
+    # "terminadora" de más, y el rango se puede lanzar entero en paralelo
+    offsets = range(limit, int(total), limit)
+    if offsets:
+        with ThreadPoolExecutor(max_workers=5) as ex:
+            for _, page, _raw in ex.map(_page_rows, offsets):
+                rows.extend(page)
+    return rows
 
 def money_to_str(m: Any) -> Tuple[str, str]:
     """
@@ -249,18 +282,17 @@ def normalize_row(li: Dict[str, Any], shop_name: str, shop_url: str) -> List[str
 
 # ---------- Main ----------
 def main():
-    # Limpia solo nuestro bloque (A..end_col) desde la fila 2 y deja todo lo demás intacto
-    write_headers_and_clear_data_block()
-
-    token = oauth_refresh()
-    shop_id, shop_name = resolve_shop_id(token)
+    sess = make_session()
+    token = oauth_refresh(sess)
+    shop_id, shop_name = resolve_shop_id(sess, token)
     shop_url = ETSY_PROFILE_URL or (f"https://www.etsy.com/shop/{shop_name}" if shop_name else "")
 
-    items = fetch_active_listings(token, shop_id)
-    print(f"Total listings: {len(items)}")
+    rows = fetch_active_rows(sess, token, shop_id, shop_name, shop_url)
+    print(f"Total listings: {len(rows)}")
 
-    rows = [normalize_row(li, shop_name, shop_url) for li in items]
-    write_rows(rows)
+    # Cabeceras + datos + limpieza del bloque en una sola llamada;
+    # sheets_common persiste el bearer de Google para el próximo run
+    write_all(rows)
     print("Finalizado.")
 
 if __name__ == "__main__":
@@ -1,11 +1,23 @@
 # sync_vinted_to_sheets.py
-import os, re, json, time, random
+import asyncio
+import functools
+import os, re, time, random
+import logging
 from urllib.parse import urlparse
 
-import gspread
-from google.oauth2.service_account import Credentials
+import orjson
+from playwright.async_api import async_playwright
 from playwright.sync_api import sync_playwright
 
+from sheets_common import open_worksheet, write_block
+from vinted_common import default_currency_for_domain, parse_price_currency_from_text
+
+# Logging perezoso (formato %-style): la línea de scroll no construye
+# el string si el nivel DEBUG está desactivado, al contrario que print(f"...")
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                    format="%(asctime)s %(levelname)s %(message)s")
+log = logging.getLogger("vinted")
+
 # ---------- Helpers genéricos ----------
 def as_text(x):
     if x is None:
@@ -17,6 +29,10 @@ ENV_PROFILE    = os.getenv("VINTED_PROFILE_URL", "").strip()   # ej: https://www
 SHEET_ID       = os.getenv("SHEET_ID")
 SHEET_TAB      = os.getenv("SHEET_TAB", "vinted_items")
 GOOGLE_SA_JSON = os.getenv("GOOGLE_SA_JSON")
+# El fallback HTML (page.goto + JSON-LD/metas/DOM) descarga 1-3 MB por
+# item y paga layout del navegador; la API JSON responde casi siempre,
+# así que el modo por defecto es solo-API y el HTML queda tras un flag.
+HTML_FALLBACK  = os.getenv("VINTED_HTML_FALLBACK", "0") == "1"
 
 if not (SHEET_ID and GOOGLE_SA_JSON and ENV_PROFILE):
     raise SystemExit("Faltan variables: SHEET_ID, GOOGLE_SA_JSON o VINTED_PROFILE_URL")
@@ -29,129 +45,53 @@ ORIGIN = f"{parsed.scheme}://{parsed.netloc}"   # p.ej. https://www.vinted.es
 DOMAIN_HINT = parsed.netloc                      # para moneda (toma TLD de aquí)
 
 # ---------- Google Sheets ----------
-creds = Credentials.from_service_account_info(
-    json.loads(GOOGLE_SA_JSON),
-    scopes=["https://www.googleapis.com/auth/spreadsheets"]
-)
-gc = gspread.authorize(creds)
-sh = gc.open_by_key(SHEET_ID)
-try:
-    ws = sh.worksheet(SHEET_TAB)
-except gspread.exceptions.WorksheetNotFound:
-    # crea con margen por si añades columnas propias a la derecha
-    ws = sh.add_worksheet(title=SHEET_TAB, rows=2000, cols=20)
+@functools.cache
+def _ws():
+    # Autentica y abre la worksheet solo en el primer uso (sheets_common
+    # cachea el cliente autorizado y el token en disco)
+    return open_worksheet(GOOGLE_SA_JSON, SHEET_ID, SHEET_TAB)
 
 HEADERS = ["id","title","price","currency","url","brand","size","status"]
 
-def _col_letter(n: int) -> str:
-    s = ""
-    while n:
-        n, r = divmod(n - 1, 26)
-        s = chr(65 + r) + s
-    return s
+_FIELDS = tuple(HEADERS)
 
-def write_headers_and_clear_data_block():
-    """
-    - No borra toda la hoja.
-    - Mantiene la fila 1 (cabeceras).
-    - Limpia solo A2..(end_col,last_row) donde escribimos nuestros datos.
-    """
-    end_col = _col_letter(len(HEADERS))
-    last_row = max(2, ws.row_count)
+def _row_values(it, _g=dict.get):
+    # dict.get precargado como default: evita resolver el método en
+    # cada una de las 8 búsquedas por fila
+    return [_g(it, f, "") for f in _FIELDS]
 
-    # Reescribe cabeceras por si acaso (orden nuevo de argumentos)
-    ws.update(values=[HEADERS], range_name="A1")
+def write_all(items):
+    """Vuelca los items a la hoja en un solo batchUpdate (sheets_common).
 
-    rng = f"A2:{end_col}{last_row}"
-    try:
-        # batch_clear está en el objeto Spreadsheet, no en Worksheet
-        ws.spreadsheet.batch_clear([rng])
-    except Exception:
-        # Fallback: sobreescribe con vacío
-        empty_rows = last_row - 1
-        if empty_rows > 0:
-            ws.update(
-                values=[[""] * len(HEADERS) for _ in range(empty_rows)],
-                range_name=rng,
-                value_input_option="RAW",
-            )
+    - No borra toda la hoja: solo el bloque de nuestras columnas.
+    - No encoge filas: las sobrantes de runs anteriores se blanquean.
+    """
+    # Los items ya vienen normalizados a str por fetch_item_detail;
+    # map + función precompilada en vez de comprensión anidada
+    write_block(_ws(), HEADERS, list(map(_row_values, items)))
+
+# ---------- Caché de detalle en disco ----------
+# El coste dominante del sync es re-pedir el detalle de items que no han
+# cambiado (y es la causa principal de 429). Cacheamos la fila ya
+# normalizada en un JSON local con TTL: en runs consecutivos dentro del
+# TTL solo se piden los items nuevos.
+CACHE_PATH = "vinted_detail_cache.json"
+CACHE_TTL = 3600  # segundos
+
+def load_detail_cache() -> dict:
+    if os.path.exists(CACHE_PATH):
+        try:
+            with open(CACHE_PATH, "rb") as f:
+                return orjson.loads(f.read())
+        except Exception:
+            pass
+    return {}
 
-def write_rows(items):
-    if not items:
-        return
-    rows = [[
-        as_text(it.get("id","")),
-        as_text(it.get("title","")),
-        as_text(it.get("price","")),
-        as_text(it.get("currency","")),
-        as_text(it.get("url","")),
-        as_text(it.get("brand","")),
-        as_text(it.get("size","")),
-        as_text(it.get("status","")),
-    ] for it in items]
-
-    # Asegura espacio suficiente (sin tocar otras columnas)
-    need = len(rows) - (ws.row_count - 1)
-    if need > 0:
-        ws.add_rows(need)
-
-    end_col = _col_letter(len(HEADERS))
-    ws.update(values=rows, range_name=f"A2:{end_col}{len(rows)+1}")
-
-# ---------- Utilidades precio/moneda ----------
-CURRENCY_MAP = {
-    "€": "EUR", "EUR": "EUR",
-    "$": "USD", "USD": "USD",
-    "£": "GBP", "GBP": "GBP",
-    "zł": "PLN", "PLN": "PLN",
-    "Kč": "CZK", "CZK": "CZK",
-    "Ft": "HUF", "HUF": "HUF",
-    "lei": "RON", "RON": "RON",
-    "CHF": "CHF",
-    "SEK": "SEK", "NOK": "NOK", "DKK": "DKK",
-}
-
-def default_currency_for_domain(domain: str) -> str:
-    # acepta host completo o solo TLD
-    d = (domain or "").split(".")[-1].lower()
-    return {
-        "es":"EUR","fr":"EUR","de":"EUR","it":"EUR","pt":"EUR","nl":"EUR","be":"EUR","ie":"EUR","lt":"EUR","lv":"EUR","ee":"EUR",
-        "pl":"PLN","cz":"CZK","hu":"HUF","ro":"RON",
-        "uk":"GBP","gb":"GBP",
-        "se":"SEK","dk":"DKK","no":"NOK",
-        "ch":"CHF",
-    }.get(d, "EUR")
-
-PRICE_PATTERNS = [
-    re.compile(r'(\d{1,3}(?:[.\s]\d{3})*(?:[.,]\d{1,2})?)\s*(€|EUR|\$|USD|£|GBP|zł|PLN|Kč|CZK|Ft|HUF|lei|RON|CHF|SEK|NOK|DKK)', re.I),
-    re.compile(r'(€|EUR|\$|USD|£|GBP|zł|PLN|Kč|CZK|Ft|HUF|lei|RON|CHF|SEK|NOK|DKK)\s*(\d{1,3}(?:[.\s]\d{3})*(?:[.,]\d{1,2})?)', re.I),
-]
-
-def parse_price_currency_from_text(text: str, domain_hint: str):
-    t = (text or "").replace("\xa0"," ").strip()
-    if not t:
-        return "", ""
-    for pat in PRICE_PATTERNS:
-        m = pat.search(t)
-        if m:
-            if len(m.groups()) == 2:
-                a, b = m.group(1), m.group(2)
-                if any(sym in a for sym in ("€","$","£")) or a.upper() in CURRENCY_MAP:
-                    curr_raw, val_raw = a, b
-                else:
-                    val_raw, curr_raw = a, b
-            else:
-                continue
-            val = val_raw.replace(" ", "").replace("\u202f","").replace(".", "").replace(",", ".")
-            try:
-                float(val)
-            except Exception:
-                pass
-            curr = CURRENCY_MAP.get(curr_raw, CURRENCY_MAP.get(curr_raw.upper(), ""))
-            if not curr:
-                curr = default_currency_for_domain(domain_hint)
-            return val, curr
-    return "", ""
+def save_detail_cache(cache: dict):
+    tmp = CACHE_PATH + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(cache))
+    os.replace(tmp, CACHE_PATH)
 
 # ---------- Rate limit helpers ----------
 RATE_LIMIT_STRINGS = ("rate limited", "too many requests")
@@ -165,6 +105,43 @@ def backoff_sleep(attempt: int):
     base = min(25, 5 * (2 ** (attempt - 1)))
     time.sleep(base + random.uniform(0, 2))
 
+class AdaptiveBackoff:
+    """Regulador adaptativo de cadencia para las llamadas de API.
+
+    El backoff exponencial fijo es de lazo abierto: espera de más cuando
+    el servidor va sobrado y de menos en picos. Aquí cada 200 relaja la
+    pausa (*0.9, suelo 0.5 s) y cada 429 la endurece (Retry-After si lo
+    manda el servidor, si no *2 con techo 60 s). Una sola instancia
+    compartida regula la cadencia agregada de todos los workers.
+    """
+    def __init__(self, floor: float = 0.5, cap: float = 60.0):
+        self.floor = floor
+        self.cap = cap
+        self.backoff = 1.0
+        self.next_ok = 0.0
+
+    def delay(self) -> float:
+        """Segundos a dormir antes de la siguiente petición."""
+        return max(0.0, self.next_ok - time.monotonic())
+
+    def on_success(self):
+        self.backoff = max(self.floor, self.backoff * 0.9)
+        self.next_ok = time.monotonic() + self.backoff
+
+    def on_rate_limited(self, retry_after=None):
+        try:
+            wait = float(retry_after)
+        except (TypeError, ValueError):
+            wait = None
+        if wait is not None:
+            # Retry-After del servidor es autoritativo
+            self.backoff = min(self.cap, max(self.floor, wait))
+        else:
+            self.backoff = min(self.cap, self.backoff * 2)
+        self.next_ok = time.monotonic() + self.backoff
+
+_PACER = AdaptiveBackoff()
+
 def title_from_dom(page) -> str:
     for sel in [
         "h1[data-testid='item-title']",
@@ -182,7 +159,20 @@ def title_from_dom(page) -> str:
     return ""
 
 # ---------- Playwright helpers ----------
-ITEM_ID_RE = re.compile(r'(?:^|/)(?:items)/(\d+)(?:-|$)')
+STATE_PATH = "playwright_state.json"
+_STATE = None
+
+def load_storage_state():
+    """Lee playwright_state.json una sola vez y lo cachea como dict.
+
+    Cada new_context(storage_state=<ruta>) relee y re-parsea el fichero;
+    pasando el dict evitamos N lecturas de disco + parses JSON.
+    """
+    global _STATE
+    if _STATE is None and os.path.exists(STATE_PATH):
+        with open(STATE_PATH, "rb") as f:
+            _STATE = orjson.loads(f.read())
+    return _STATE
 
 def collect_item_ids_with_browser(profile_url: str) -> list[str]:
     with sync_playwright() as p:
@@ -192,7 +182,15 @@ def collect_item_ids_with_browser(profile_url: str) -> list[str]:
                         "AppleWebKit/537.36 (KHTML, like Gecko) "
                         "Chrome/124.0.0.0 Safari/537.36"),
             locale="es-ES",
-            viewport={"width": 1280, "height": 2000},
+            viewport={"width": 1280, "height": 800},
+        )
+        # Solo necesitamos los <a href>: fuera miniaturas, fuentes y CSS
+        # (~80-90% del ancho de banda del scroll y menos CPU de render)
+        context.route(
+            "**/*",
+            lambda route: route.abort()
+            if route.request.resource_type in {"image", "media", "font", "stylesheet"}
+            else route.continue_(),
         )
         page = context.new_page()
 
@@ -200,8 +198,11 @@ def collect_item_ids_with_browser(profile_url: str) -> list[str]:
         sep = "&" if "?" in url else "?"
         url = f"{url}{sep}status=active&order=newest_first"
 
-        print("[pw] goto", url)
-        page.goto(url, wait_until="networkidle", timeout=60_000)
+        log.info("[pw] goto %s", url)
+        # domcontentloaded + espera corta: networkidle se eterniza con
+        # beacons de analítica y ya no esperamos a las imágenes
+        page.goto(url, wait_until="domcontentloaded", timeout=60_000)
+        page.wait_for_timeout(1500)
 
         try:
             page.locator("role=button[name=/Activos/i]").first.click(timeout=2_000)
@@ -211,18 +212,28 @@ def collect_item_ids_with_browser(profile_url: str) -> list[str]:
         seen_ids: set[str] = set()
         stable_rounds = 0
         for i in range(100):
-            hrefs = page.eval_on_selector_all("a[href]", "els => els.map(e => e.getAttribute('href'))")
-            added = 0
-            for h in hrefs:
-                if not h:
-                    continue
-                m = ITEM_ID_RE.search(h)
-                if m:
-                    iid = m.group(1)
-                    if iid not in seen_ids:
-                        seen_ids.add(iid)
-                        added += 1
-            print(f"[pw] scroll {i+1}: total_ids={len(seen_ids)} (+{added})")
+            # Un solo evaluate por ronda: filtra enlaces, extrae ids,
+            # descarta los ya vistos y hace scroll DENTRO del navegador.
+            # El set de vistos vive en window.__seenIds entre evaluates
+            # (la página solo scrollea, no navega), así que por CDP solo
+            # cruzan los ids NUEVOS de cada ronda — en ninguna dirección
+            # viaja el acumulado.
+            new_ids = page.evaluate(
+                r"""() => {
+                  window.__seenIds = window.__seenIds || new Set();
+                  const out = [];
+                  for (const a of document.querySelectorAll('a[href*="/items/"]')) {
+                    const m = (a.getAttribute('href') || '').match(/(?:^|\/)items\/(\d+)(?:-|$)/);
+                    if (m && !window.__seenIds.has(m[1])) { window.__seenIds.add(m[1]); out.push(m[1]); }
+                  }
+                  const el = document.scrollingElement || document.documentElement || document.body;
+                  el.scrollTo(0, el.scrollHeight);
+                  return out;
+                }"""
+            )
+            seen_ids.update(new_ids)
+            added = len(new_ids)
+            log.debug("[pw] scroll %d: total_ids=%d (+%d)", i + 1, len(seen_ids), added)
 
             if added == 0:
                 stable_rounds += 1
@@ -231,31 +242,25 @@ def collect_item_ids_with_browser(profile_url: str) -> list[str]:
             if stable_rounds >= 4:
                 break
 
-            page.evaluate("""
-                const el = document.scrollingElement || document.documentElement || document.body;
-                el.scrollTo(0, el.scrollHeight);
-            """)
             page.wait_for_timeout(1200)
-            try:
-                page.wait_for_load_state("networkidle", timeout=5_000)
-            except Exception:
-                pass
 
-        context.storage_state(path="playwright_state.json")
+        # Guarda el estado en disco y cachea el dict para los fetch de detalle
+        global _STATE
+        _STATE = context.storage_state(path=STATE_PATH)
         browser.close()
         return list(seen_ids)
 
-def _get_meta(page, prop):
-    try:
-        return page.eval_on_selector(f'meta[property="{prop}"]', "el => el ? el.content : null")
-    except Exception:
-        return None
-
-def _parse_attributes_map(page):
-    try:
-        return page.evaluate("""
+# Un solo evaluate recoge metatags, bloques JSON-LD y el mapa dt/dd:
+# antes eran 5+ viajes CDP por item (4 _get_meta + _parse_attributes_map).
+_PAGE_BUNDLE_JS = """
 () => {
-  const out = {};
+  const metas = {};
+  document.querySelectorAll('meta[property]').forEach(m => {
+    metas[m.getAttribute('property')] = m.getAttribute('content') || '';
+  });
+  const jsonld = [...document.querySelectorAll('script[type="application/ld+json"]')]
+    .map(el => el.textContent || '').filter(Boolean);
+  const attrs = {};
   document.querySelectorAll('dt').forEach(dt => {
     const key = (dt.textContent || '').trim().toLowerCase();
     const dd = dt.nextElementSibling;
@@ -263,24 +268,29 @@ def _parse_attributes_map(page):
     let val = (dd.textContent || '').trim();
     const a = dd.querySelector('a'); if (a) val = (a.textContent || '').trim();
     const span = dd.querySelector('span'); if (span && (!val || val.length < span.textContent.length)) val = (span.textContent || '').trim();
-    out[key] = val;
+    attrs[key] = val;
   });
-  return out;
+  return {metas, jsonld, attrs};
 }
-""")
+"""
+
+def _page_bundle(page) -> dict:
+    try:
+        return page.evaluate(_PAGE_BUNDLE_JS) or {}
     except Exception:
         return {}
 
-def _pick_attr(attr_map, variants):
-    variants = [v.lower() for v in variants]
-    for k, v in attr_map.items():
-        if k.lower() in variants:
-            return v
-    for k, v in attr_map.items():
-        lk = k.lower()
-        if any(lk.startswith(pfx) or pfx in lk for pfx in variants):
-            return v
-    return ""
+# Regex precompiladas por familia de atributo: un solo barrido del dict
+# con match a nivel C en vez de dos pasadas con startswith/in por clave.
+_ATTR_REGEX = {
+    "brand":  re.compile(r"^(?:marca|brand|marque|marke|merk)", re.I),
+    "size":   re.compile(r"^(?:talla|size|taille|größe|maat|taglia|rozmiar)", re.I),
+    "status": re.compile(r"^(?:estado|condition|état|zustand|condición)", re.I),
+}
+
+def _pick_attr(attr_map, which):
+    r = _ATTR_REGEX[which]
+    return next((v for k, v in attr_map.items() if r.search(k)), "")
 
 def _price_from_dom(page, domain_hint: str):
     texts = []
@@ -304,175 +314,427 @@ def _price_from_dom(page, domain_hint: str):
             return val, curr
     return "", ""
 
-def fetch_item_detail_with_browser(item_id: str, origin: str, domain_hint: str) -> dict:
+def _row_from_item(obj: dict, item_id: str, origin: str, domain_hint: str) -> dict:
+    """Mapea el objeto de la API al dict de 8 campos de la hoja.
+
+    Una sola función en el camino caliente: un dict de salida por item,
+    sin literales repetidos en cada rama del bucle.
+    """
+    p = obj.get("price", "")
+    if isinstance(p, dict):
+        price_val = p.get("amount", "")
+        currency = p.get("currency_code", "")
+    else:
+        price_val = p
+        currency = obj.get("currency") or obj.get("currency_code", "")
+    return {
+        "id": as_text(obj.get("id", item_id)),
+        "title": as_text(obj.get("title", "")),
+        "price": as_text(price_val),
+        "currency": as_text(currency or default_currency_for_domain(domain_hint)),
+        "url": as_text(obj.get("url") or f"{origin}/items/{item_id}"),
+        "brand": as_text(obj.get("brand_title", "")),
+        "size": as_text(obj.get("size_title", "")),
+        "status": as_text(obj.get("status", "")),
+    }
+
+# Endpoint de detalle. La variante /web/api/v2 devolvía el mismo payload
+# que /api/v2 en todos los dominios, así que sondear las dos solo añadía
+# una petición extra en cada fallo; nos quedamos con la rápida.
+API_ITEM_PATH = "/api/v2/items/{}"
+
+# Vinted aplica un retardo de decenas de segundos a /api/v2 con huella de
+# navegador de escritorio y responde rápido a la app iOS: las llamadas de
+# API van con cabeceras de la app (el scroll del perfil sigue con UA de
+# escritorio, que es lo que espera la web).
+API_HEADERS = {
+    "User-Agent": "Vinted/24.32 (iPhone; iOS 17.4; Scale/3.00)",
+    "X-Api-Version": "2",
+    "Accept": "application/json",
+}
+
+def _minimal_row(item_id: str, origin: str, domain_hint: str) -> dict:
+    return {
+        "id": as_text(item_id),
+        "title": "",
+        "price": "",
+        "currency": default_currency_for_domain(domain_hint),
+        "url": f"{origin}/items/{item_id}",
+        "brand": "",
+        "size": "",
+        "status": "",
+    }
+
+def fetch_item_detail(context, item_id: str, origin: str, domain_hint: str,
+                      cached: dict | None = None) -> dict:
     """
     1) Intenta API JSON con cookies del navegador.
     2) Si no, JSON-LD.
     3) Si no, metatags OpenGraph/product.
     4) Si no, DOM (clases/testid con 'price' o cualquier nodo con símbolo/ISO).
     Con reintentos si hay rate limit.
+    Recibe el BrowserContext compartido: no arranca Chromium por item.
     """
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(storage_state="playwright_state.json")
-        req = context.request
-
-        # ---- Intento 1: API JSON
-        for url in (
-            f"{origin}/api/v2/items/{item_id}",
-            f"{origin}/web/api/v2/items/{item_id}",
-        ):
-            r = req.get(url, timeout=30_000)
-            if r.ok:
-                try:
-                    data = r.json()
-                    obj = data.get("item") or data.get("data") or data
-                    if isinstance(obj, dict):
-                        price_field = obj.get("price", "")
-                        if isinstance(price_field, dict):
-                            price_val = price_field.get("amount", "")
-                            currency = price_field.get("currency_code", "")
-                        else:
-                            price_val = price_field
-                            currency = obj.get("currency") or obj.get("currency_code", "")
-                        url_item = obj.get("url") or f"{origin}/items/{item_id}"
-                        browser.close()
-                        return {
-                            "id": as_text(obj.get("id", item_id)),
-                            "title": as_text(obj.get("title","")),
-                            "price": as_text(price_val),
-                            "currency": as_text(currency or default_currency_for_domain(domain_hint)),
-                            "url": as_text(url_item),
-                            "brand": as_text(obj.get("brand_title","")),
-                            "size": as_text(obj.get("size_title","")),
-                            "status": as_text(obj.get("status","")),
-                        }
-                except Exception:
-                    pass
-
-        # ---- Intento 2-4: HTML con reintentos si hay rate limit
-        page = context.new_page()
-        item_url = f"{origin}/items/{item_id}"
-
-        title = ""
-        price_val = ""
-        currency = ""
-        brand = ""
-        size = ""
-        status = ""
-
-        for attempt in range(1, 4):
-            page.goto(item_url, wait_until="domcontentloaded", timeout=30_000)
-
-            # ¿rate limited?
-            if is_rate_limited_title(page.title()):
-                if attempt < 3:
-                    backoff_sleep(attempt)
-                    continue
-
-            # 2) JSON-LD
+    req = context.request
+    item_url = f"{origin}/items/{item_id}"
+    cond_headers = _conditional_headers(cached)
+    api_url = origin + API_ITEM_PATH.format(item_id)
+
+    # ---- Intento 1: API JSON
+    for attempt in range(1, 4):
+        time.sleep(_PACER.delay())
+        r = req.get(api_url, timeout=30_000, headers=cond_headers)
+        if r.status == 429:
+            _PACER.on_rate_limited(r.headers.get("retry-after"))
+            if attempt < 3:
+                time.sleep(_PACER.delay())
+                continue
+            break
+        if r.status == 304 and cached:
+            _PACER.on_success()
+            return cached["row"]
+        if r.ok:
+            _PACER.on_success()
             try:
-                els = page.query_selector_all('script[type="application/ld+json"]')
-                for el in els:
-                    data = el.text_content()
-                    if not data:
-                        continue
-                    ld = json.loads(data)
-                    if isinstance(ld, dict):
-                        if not title:
-                            title = ld.get("name","") or title
-                        offers = ld.get("offers") or {}
-                        if isinstance(offers, dict):
-                            price_val = price_val or offers.get("price","") or ""
-                            currency  = currency  or offers.get("priceCurrency","") or ""
-                        if isinstance(ld.get("brand"), dict) and not brand:
-                            brand = ld["brand"].get("name","") or brand
-                        if price_val and currency and title:
-                            break
+                data = orjson.loads(r.body())
+                obj = data.get("item") or data.get("data") or data
+                if isinstance(obj, dict):
+                    return _row_from_item(obj, item_id, origin, domain_hint)
             except Exception:
                 pass
-
-            # 3) Metatags
-            if not title:
-                meta_title = _get_meta(page, "og:title")
-                if meta_title and not is_rate_limited_title(meta_title):
-                    title = meta_title
-            if not title:
-                page_title = page.title()
-                if page_title and not is_rate_limited_title(page_title):
-                    title = page_title
-
-            # 3.b) Título por DOM (fallback)
-            if not title:
-                title = title_from_dom(page)
-
-            if not price_val:
-                price_val = _get_meta(page, "product:price:amount") or _get_meta(page, "og:price:amount") or ""
-            if not currency:
-                currency = _get_meta(page, "product:price:currency") or _get_meta(page, "og:price:currency") or ""
-
-            # 4) DOM directo para precio
-            if not price_val or not currency:
-                p_dom, c_dom = _price_from_dom(page, domain_hint)
-                price_val = price_val or p_dom
-                currency  = currency  or c_dom
-
-            # Atributos
-            attr_map = _parse_attributes_map(page)
-            if not brand:
-                brand = _pick_attr(attr_map, ["marca","brand","marque","marke","merk","marca de"])
-            if not size:
-                size = _pick_attr(attr_map, ["talla","size","taille","größe","maat","taglia","rozmiar"])
-            if not status:
-                status = _pick_attr(attr_map, ["estado","condition","état","zustand","condición"])
-
-            if not title and attempt < 3:
+        break
+
+    if not HTML_FALLBACK:
+        # Sin fallback HTML: fila mínima y seguimos con el resto
+        log.warning("[detail] API sin datos para %s; fila mínima "
+                    "(exporta VINTED_HTML_FALLBACK=1 para scraping HTML)", item_id)
+        return _minimal_row(item_id, origin, domain_hint)
+
+    # ---- Intento 2-4: HTML con reintentos si hay rate limit
+    page = context.new_page()
+
+    title = ""
+    price_val = ""
+    currency = ""
+    brand = ""
+    size = ""
+    status = ""
+
+    for attempt in range(1, 4):
+        page.goto(item_url, wait_until="domcontentloaded", timeout=30_000)
+
+        # ¿rate limited?
+        if is_rate_limited_title(page.title()):
+            if attempt < 3:
                 backoff_sleep(attempt)
                 continue
-            break  # salimos del bucle de reintentos
 
+        bundle = _page_bundle(page)
+        metas = bundle.get("metas") or {}
+
+        # 2) JSON-LD
+        for data in bundle.get("jsonld") or []:
+            try:
+                ld = orjson.loads(data)
+            except Exception:
+                continue
+            if isinstance(ld, dict):
+                if not title:
+                    title = ld.get("name","") or title
+                offers = ld.get("offers") or {}
+                if isinstance(offers, dict):
+                    price_val = price_val or offers.get("price","") or ""
+                    currency  = currency  or offers.get("priceCurrency","") or ""
+                if isinstance(ld.get("brand"), dict) and not brand:
+                    brand = ld["brand"].get("name","") or brand
+                if price_val and currency and title:
+                    break
+
+        # 3) Metatags
+        if not title:
+            meta_title = metas.get("og:title")
+            if meta_title and not is_rate_limited_title(meta_title):
+                title = meta_title
+        if not title:
+            page_title = page.title()
+            if page_title and not is_rate_limited_title(page_title):
+                title = page_title
+
+        # 3.b) Título por DOM (fallback)
+        if not title:
+            title = title_from_dom(page)
+
+        if not price_val:
+            price_val = metas.get("product:price:amount") or metas.get("og:price:amount") or ""
         if not currency:
-            currency = default_currency_for_domain(domain_hint)
+            currency = metas.get("product:price:currency") or metas.get("og:price:currency") or ""
+
+        # 4) DOM directo para precio
+        if not price_val or not currency:
+            p_dom, c_dom = _price_from_dom(page, domain_hint)
+            price_val = price_val or p_dom
+            currency  = currency  or c_dom
+
+        # Atributos
+        attr_map = bundle.get("attrs") or {}
+        if not brand:
+            brand = _pick_attr(attr_map, "brand")
+        if not size:
+            size = _pick_attr(attr_map, "size")
+        if not status:
+            status = _pick_attr(attr_map, "status")
+
+        if not title and attempt < 3:
+            backoff_sleep(attempt)
+            continue
+        break  # salimos del bucle de reintentos
+
+    if not currency:
+        currency = default_currency_for_domain(domain_hint)
+
+    page.close()
+    return {
+        "id": as_text(item_id),
+        "title": as_text(title).strip(),
+        "price": as_text(price_val).strip(),
+        "currency": as_text(currency).strip(),
+        "url": as_text(item_url),
+        "brand": as_text(brand).strip(),
+        "size": as_text(size).strip(),
+        "status": as_text(status).strip(),
+    }
+
+# ---------- Detalle en paralelo (asyncio) ----------
+DETAIL_WORKERS = 4
+DETAIL_DELAY = (0.8, 1.6)  # cadencia del modo HTML serie; el modo API usa _PACER
+
+async def _api_row_async(req, item_id: str, cached: dict | None = None) -> tuple[dict, str | None]:
+    """Mismo intento de API que fetch_item_detail, en versión awaitable.
+
+    Devuelve (fila, etag), o (None, None) si la API no dio datos: el
+    caller decide entre la fila cacheada o saltarse el item, nunca se
+    escribe una fila en blanco. Si hay entrada cacheada con ETag se
+    manda If-None-Match: un 304 confirma la fila guardada sin cuerpo
+    que descargar ni parsear.
+    """
+    headers = _conditional_headers(cached)
+    api_url = ORIGIN + API_ITEM_PATH.format(item_id)
+    for attempt in range(1, 4):
+        await asyncio.sleep(_PACER.delay())
+        r = await req.get(api_url, timeout=30_000, headers=headers)
+        if r.status == 429:
+            _PACER.on_rate_limited(r.headers.get("retry-after"))
+            if attempt < 3:
+                await asyncio.sleep(_PACER.delay())
+                continue
+            break
+        if r.status == 304 and cached:
+            _PACER.on_success()
+            return cached["row"], cached.get("etag")
+        if r.ok:
+            _PACER.on_success()
+            try:
+                data = orjson.loads(await r.body())
+                obj = data.get("item") or data.get("data") or data
+                if isinstance(obj, dict):
+                    return (_row_from_item(obj, item_id, ORIGIN, DOMAIN_HINT),
+                            r.headers.get("etag"))
+            except Exception:
+                pass
+        break
+    log.warning("[detail] API sin datos para %s", item_id)
+    return None, None
 
-        browser.close()
-        return {
-            "id": as_text(item_id),
-            "title": as_text(title).strip(),
-            "price": as_text(price_val).strip(),
-            "currency": as_text(currency).strip(),
-            "url": as_text(item_url),
-            "brand": as_text(brand).strip(),
-            "size": as_text(size).strip(),
-            "status": as_text(status).strip(),
-        }
+def _conditional_headers(cached: dict | None) -> dict:
+    if cached and cached.get("etag"):
+        return dict(API_HEADERS, **{"If-None-Match": cached["etag"]})
+    return API_HEADERS
+
+async def _fetch_rows_async(ids: list[str], cache: dict) -> dict:
+    """K workers sobre un solo contexto/APIRequestContext compartido.
+
+    El bucle serie dejaba la red ociosa durante cada pausa; con K workers
+    se solapa la latencia y el _PACER compartido regula la cadencia
+    AGREGADA contra el servidor.
+    """
+    rows: dict[str, tuple] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for iid in ids:
+        queue.put_nowait(iid)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context(storage_state=load_storage_state())
+        req = context.request
+
+        async def worker():
+            while True:
+                try:
+                    iid = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                rows[iid] = await _api_row_async(req, iid, cache.get(iid))
+                if len(rows) % 10 == 0:
+                    log.info("[detail] fetched %d/%d", len(rows), len(ids))
+
+        await asyncio.gather(*(worker() for _ in range(DETAIL_WORKERS)))
+        await browser.close()
+    return rows
+
+MEMBER_ID_RE = re.compile(r"/member/(\d+)")
+
+def collect_rows_via_user_api(context) -> list[dict]:
+    """Camino rápido: pagina /api/v2/users/{id}/items?per_page=100.
+
+    Cada página JSON (~5 KB) trae los items con todos los campos de la
+    fila incluidos, así que sustituye de golpe el scroll del perfil
+    (200-400 KB de HTML por pantalla) Y el fetch de detalle por item:
+    ceil(N/100) peticiones en total. Cada página se reintenta hasta 3
+    veces a través del _PACER; si aun así falla devolvemos [] — nunca
+    un snapshot parcial, que al escribirse blanquearía el resto del
+    catálogo — y main() cae al camino scroll + detalle de siempre.
+    """
+    m = MEMBER_ID_RE.search(ENV_PROFILE)
+    if not m:
+        return []
+    uid = m.group(1)
+    rows: list[dict] = []
+    page_n = 1
+    while True:
+        data = None
+        for attempt in range(1, 4):
+            # delay() al entrar en cada intento: así el backoff que fija
+            # on_rate_limited se duerme de verdad antes de reintentar
+            time.sleep(_PACER.delay())
+            r = context.request.get(
+                f"{ORIGIN}/api/v2/users/{uid}/items",
+                params={"per_page": 100, "page": page_n},
+                headers=API_HEADERS,
+                timeout=30_000,
+            )
+            if r.status == 429:
+                _PACER.on_rate_limited(r.headers.get("retry-after"))
+                continue
+            if r.ok:
+                _PACER.on_success()
+                try:
+                    data = orjson.loads(r.body())
+                except Exception:
+                    data = None
+                break
+            log.info("[api] users/items devolvió %d en página %d (intento %d)",
+                     r.status, page_n, attempt)
+        if data is None:
+            # Fallo persistente a mitad de paginación: un snapshot parcial
+            # escrito en la hoja borraría los items que faltan, así que
+            # descartamos lo acumulado y main() cae al camino scroll
+            log.info("[api] users/items sin datos en página %d; fallback a scroll", page_n)
+            return []
+        batch = data.get("items") or []
+        if not batch:
+            break
+        rows.extend(
+            _row_from_item(obj, as_text(obj.get("id", "")), ORIGIN, DOMAIN_HINT)
+            for obj in batch
+        )
+        if len(batch) < 100:
+            break
+        page_n += 1
+    return rows
 
 # ---------- Main ----------
 def main():
-    # Limpia solo nuestro bloque (A..end_col) desde la fila 2 y deja todo lo demás intacto
-    write_headers_and_clear_data_block()
-
     profile_url = ENV_PROFILE
-    print("CONFIG:", "ORIGIN=", ORIGIN, "PROFILE_URL=", profile_url, "SHEET_ID=", SHEET_ID)
+    log.info("CONFIG: ORIGIN=%s PROFILE_URL=%s SHEET_ID=%s", ORIGIN, profile_url, SHEET_ID)
+
+    # Camino rápido: API de items del usuario (sin scroll ni detalle por item)
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        context = browser.new_context(storage_state=load_storage_state())
+        if load_storage_state() is None:
+            # Sin cookies previas: visita el origen para que la API no rechace
+            pg = context.new_page()
+            try:
+                pg.goto(ORIGIN, wait_until="domcontentloaded", timeout=30_000)
+            except Exception:
+                pass
+            pg.close()
+        rows = collect_rows_via_user_api(context)
+        browser.close()
+    if rows:
+        log.info("[api] %d items via users/items; sin scroll ni detalle", len(rows))
+        write_all(rows)
+        return
 
     ids = collect_item_ids_with_browser(profile_url)
-    print(f"[pw] total item ids found: {len(ids)}")
+    log.info("[pw] total item ids found: %d", len(ids))
     if not ids:
-        print("No hay IDs visibles (¿perfil con artículos ocultos/vacaciones?).")
+        log.warning("No hay IDs visibles (¿perfil con artículos ocultos/vacaciones?).")
         return
 
+    cache = load_detail_cache()
+    now = time.time()
+    fresh = {iid: cache[iid]["row"] for iid in ids
+             if iid in cache and now - cache[iid].get("ts", 0) < CACHE_TTL}
+    to_fetch = [iid for iid in ids if iid not in fresh]
+
+    if to_fetch and not HTML_FALLBACK:
+        # Modo API: K workers asyncio solapan la latencia de red
+        fetched = asyncio.run(_fetch_rows_async(to_fetch, cache))
+    elif to_fetch:
+        # Modo HTML: serie, con un solo navegador/contexto compartido
+        fetched = {}
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True)
+            context = browser.new_context(storage_state=load_storage_state())
+            for i, iid in enumerate(to_fetch, 1):
+                fetched[iid] = (fetch_item_detail(context, iid, ORIGIN,
+                                                  DOMAIN_HINT, cache.get(iid)), None)
+                if i % 10 == 0:
+                    log.info("[detail] fetched %d/%d", i, len(to_fetch))
+                # Ritmo más suave para evitar 429
+                time.sleep(random.uniform(*DETAIL_DELAY))
+                if i % 25 == 0:
+                    time.sleep(random.uniform(6, 9))
+            browser.close()
+    else:
+        fetched = {}
+
     items = []
-    for i, iid in enumerate(ids, 1):
-        items.append(fetch_item_detail_with_browser(iid, ORIGIN, DOMAIN_HINT))
-        if i % 10 == 0:
-            print(f"[detail] fetched {i}/{len(ids)}")
-        # Ritmo más suave para evitar 429
-        time.sleep(random.uniform(0.8, 1.6))
-        if i % 25 == 0:
-            time.sleep(random.uniform(6, 9))
-
-    print(f"Total artículos extraídos: {len(items)}")
+    skipped = 0
+    for iid in ids:
+        if iid in fresh:
+            items.append(fresh[iid])
+        elif iid in fetched:
+            row, etag = fetched[iid]
+            if row is None:
+                # API sin datos (429 persistente, anti-bot): mejor la fila
+                # cacheada aunque haya caducado que una en blanco pisando
+                # datos buenos, y el fallo no se cachea — el próximo run
+                # reintenta
+                hit = cache.get(iid)
+                if hit:
+                    items.append(hit["row"])
+                else:
+                    skipped += 1
+                continue
+            entry = {"ts": now, "row": row}
+            if etag:
+                entry["etag"] = etag
+            cache[iid] = entry
+            items.append(row)
+    hits = len(fresh)
+    if skipped:
+        log.warning("[detail] %d items sin datos de API omitidos en este run", skipped)
+
+    # Poda ids que ya no están en el perfil para que el fichero no crezca
+    save_detail_cache({iid: cache[iid] for iid in ids if iid in cache})
+    log.info("[cache] %d/%d items servidos desde caché", hits, len(ids))
+
+    log.info("Total artículos extraídos: %d", len(items))
     if items:
-        write_rows(items)
+        # Cabeceras + datos + limpieza del bloque en una sola llamada
+        write_all(items)
 
 if __name__ == "__main__":
     main()
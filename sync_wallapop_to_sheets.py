@@ -1,14 +1,23 @@
 # sync_wallapop_to_sheets.py
+import operator
 import os
-import json
-import time
-from datetime import datetime
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional, Tuple
 
-import gspread
-from google.oauth2.service_account import Credentials
+# orjson decodifica JSON-LD de 10-100 KB varias veces más rápido que el
+# json de la stdlib; si no está instalado, seguimos funcionando igual
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+from lxml import html as lxml_html
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 
+from sheets_common import open_worksheet
+
 # ============ Config ============
 WALLAPOP_PROFILE_URL = os.getenv("WALLAPOP_PROFILE_URL", "").strip()  # URL pública del perfil/tienda
 SHEET_ID = os.getenv("SHEET_ID", "").strip()
@@ -16,6 +25,20 @@ SHEET_TAB = os.getenv("SHEET_TAB", "wallapop_items").strip()
 GOOGLE_SA_JSON = os.getenv("GOOGLE_SA_JSON", "").strip()
 HEADLESS = os.getenv("HEADLESS", "true").strip().lower() != "false"
 PAGE_LOCALE = os.getenv("PAGE_LOCALE", "es-ES").strip()
+DETAIL_WORKERS = int(os.getenv("DETAIL_WORKERS", "4"))
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36"
+)
+
+# Cookies/estado del navegador persistidos entre runs: un contexto
+# "caliente" evita renegociar el challenge anti-bot de Wallapop cada vez
+STATE_PATH = "wp_state.json"
+
+def _storage_state():
+    return STATE_PATH if os.path.exists(STATE_PATH) else None
 
 if not (WALLAPOP_PROFILE_URL and SHEET_ID and GOOGLE_SA_JSON):
     raise SystemExit("Faltan variables: WALLAPOP_PROFILE_URL, SHEET_ID o GOOGLE_SA_JSON")
@@ -38,81 +61,121 @@ HEADERS = [
     "timestamp_utc",
 ]
 
+# Proyección fila-dict -> lista en orden de columnas, resuelta una vez;
+# fetch_item_detail garantiza que toda fila trae las 14 claves
+_ROW_GET = operator.itemgetter(*HEADERS)
+
 # ============ Google Sheets helpers ============
 def get_sheet():
-    creds = Credentials.from_service_account_info(
-        json.loads(GOOGLE_SA_JSON),
-        scopes=["https://www.googleapis.com/auth/spreadsheets"]
-    )
-    gc = gspread.authorize(creds)
-    sh = gc.open_by_key(SHEET_ID)
-    try:
-        ws = sh.worksheet(SHEET_TAB)
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title=SHEET_TAB, rows="2000", cols=str(len(HEADERS) + 5))
-    print(f"Spreadsheet URL: {sh.url}")
+    # Auth y apertura compartidas con los otros syncs (sheets_common)
+    ws = open_worksheet(GOOGLE_SA_JSON, SHEET_ID, SHEET_TAB, cols=len(HEADERS) + 5)
+    print(f"Spreadsheet URL: {ws.spreadsheet.url}")
     print(f"Worksheet title: {ws.title}")
     return ws
 
-def _col_letter(n: int) -> str:
-    s = ""
-    while n:
-        n, r = divmod(n - 1, 26)
-        s = chr(65 + r) + s
-    return s
-
-def write_headers_and_clear_data_block(ws):
+def write_headers_and_clear_data_block(ws, rewrite_header: bool = True):
     """
     - No borra toda la hoja.
     - Mantiene la fila 1 (cabeceras).
     - Limpia solo el rectángulo de datos A2..(end_col,row_count).
+    - Cabecera (si toca) y limpieza viajan en UN solo batchUpdate, sin
+      estado intermedio a medio escribir.
     """
-    end_col = _col_letter(len(HEADERS))
+    ncols = len(HEADERS)
     last_row = ws.row_count
-
-    # Reescribe cabeceras por si no estaban
-    ws.update("A1", [HEADERS])
-
-    # Limpia SOLO el bloque donde escribimos (sin tocar otras columnas)
-    rng = f"A2:{end_col}{last_row}"
-    try:
-        ws.batch_clear([rng])
-    except AttributeError:
-        # Fallback si tu gspread no tiene batch_clear
-        empty_rows = last_row - 1
-        if empty_rows > 0:
-            ws.update(rng, [[""] * len(HEADERS) for _ in range(empty_rows)], value_input_option="RAW")
+    reqs = []
+
+    if rewrite_header:
+        reqs.append({
+            "updateCells": {
+                "rows": [{"values": [{"userEnteredValue": {"stringValue": h}}
+                                     for h in HEADERS]}],
+                "fields": "userEnteredValue",
+                "start": {"sheetId": ws.id, "rowIndex": 0, "columnIndex": 0},
+            }
+        })
+
+    if last_row > 1:
+        # repeatCell sin valor borra userEnteredValue en todo el rango:
+        # payload mínimo, el servidor hace el barrido
+        reqs.append({
+            "repeatCell": {
+                "range": {"sheetId": ws.id,
+                          "startRowIndex": 1, "endRowIndex": last_row,
+                          "startColumnIndex": 0, "endColumnIndex": ncols},
+                "fields": "userEnteredValue",
+            }
+        })
+
+    if reqs:
+        ws.spreadsheet.batch_update({"requests": reqs})
 
 def write_rows(ws, rows: List[Dict[str, Any]]):
     if not rows:
         return
-    values = [[row.get(col, "") for col in HEADERS] for row in rows]
-
-    # Asegura espacio suficiente (sin tocar otras columnas)
-    need = len(values) - (ws.row_count - 1)
-    if need > 0:
-        ws.add_rows(need)
-
-    end_col = _col_letter(len(HEADERS))
-    ws.update(
-        range_name=f"A2:{end_col}{len(values) + 1}",
-        values=values,
-        value_input_option="RAW"
-    )
+    values = [list(_ROW_GET(row)) for row in rows]
+
+    # values.append hace el append en el servidor: una sola llamada HTTP,
+    # sin add_rows previo ni cálculo de rango de destino. OVERWRITE (el
+    # default) rellena el bloque ya limpiado en vez de insertar filas
+    # nuevas, que haría crecer la hoja sin límite run tras run. La API
+    # admite miles de filas por request (tope ~10 MB); troceamos a 500
+    # por si un perfil enorme con descripciones largas se acercara al
+    # límite.
+    CHUNK = 500
+    for i in range(0, len(values), CHUNK):
+        ws.append_rows(
+            values[i:i + CHUNK],
+            value_input_option="RAW",
+            table_range="A1",
+        )
+
+# ============ Caché local de items ============
+# Filas ya extraídas, con una huella barata (precio + imagen de la
+# tarjeta del perfil) que delata cambios: en runs incrementales solo se
+# visitan los items nuevos o cuya tarjeta cambió.
+CACHE_PATH = "wallapop_cache.json"
+# Versión de cabecera registrada en la caché: mientras no cambie HEADERS
+# no hace falta reescribir la fila 1 en cada run del cron
+HEADER_VERSION = "v1:" + ",".join(HEADERS)
+
+def _header_stamp(ws) -> str:
+    # El sello va ligado a la hoja concreta (id del spreadsheet, nombre y
+    # sheetId de la pestaña), no solo a HEADERS: si cambia SHEET_ID /
+    # SHEET_TAB o se recrea la pestaña (sheetId nuevo), el sello viejo no
+    # coincide y la fila 1 se reescribe en vez de quedar una hoja sin
+    # cabecera con los datos desalineados
+    return f"{SHEET_ID}/{SHEET_TAB}/{ws.id}|{HEADER_VERSION}"
+
+def _load_cache() -> Dict[str, Any]:
+    if os.path.exists(CACHE_PATH):
+        try:
+            with open(CACHE_PATH, "rb") as f:
+                return _json.loads(f.read())
+        except Exception:
+            pass
+    return {}
+
+def _save_cache(cache: Dict[str, Any]):
+    tmp = CACHE_PATH + ".tmp"
+    payload = _json.dumps(cache)
+    mode = "wb" if isinstance(payload, bytes) else "w"
+    with open(tmp, mode) as f:
+        f.write(payload)
+    os.replace(tmp, CACHE_PATH)
 
 # ============ Scraping helpers ============
+_PRICE_RE = re.compile(r"[\d.,]+")
+_COMMA_TRANS = str.maketrans({",": "."})
+
 def normalize_price(raw: Optional[str]) -> Tuple[str, str]:
     if not raw:
         return "", ""
     txt = raw.strip()
-    currency = ""
-    if "€" in txt or "EUR" in txt.upper():
-        currency = "€"
-    digits = []
-    for ch in txt:
-        if ch.isdigit() or ch in [".", ","]:
-            digits.append(ch)
-    num = "".join(digits).replace(",", ".")
+    currency = "€" if ("€" in txt or "EUR" in txt.upper()) else ""
+    # Un search compilado a nivel C en vez del bucle carácter a carácter
+    m = _PRICE_RE.search(txt)
+    num = m.group(0).translate(_COMMA_TRANS) if m else ""
     return (num, currency)
 
 def parse_json_ld(block_text: str) -> Dict[str, Any]:
@@ -121,8 +184,8 @@ def parse_json_ld(block_text: str) -> Dict[str, Any]:
     """
     out: Dict[str, Any] = {}
     try:
-        data = json.loads(block_text)
-    except json.JSONDecodeError:
+        data = _json.loads(block_text)
+    except ValueError:
         return out
 
     nodes = data if isinstance(data, list) else [data]
@@ -172,62 +235,105 @@ def parse_json_ld(block_text: str) -> Dict[str, Any]:
             return out
     return out
 
-def extract_with_selectors(page) -> Dict[str, Any]:
+def _jsonld_from_html(html: str) -> Dict[str, Any]:
+    """Extrae el Product JSON-LD de HTML estático con lxml (sin navegador)."""
+    try:
+        root = lxml_html.fromstring(html)
+    except Exception:
+        return {}
+    for txt in root.xpath('//script[@type="application/ld+json"]/text()'):
+        # Prefiltro barato: la mayoría de bloques son Organization /
+        # BreadcrumbList; si ni menciona "Product" nos ahorramos el loads
+        if '"Product"' not in txt:
+            continue
+        parsed = parse_json_ld(txt)
+        if parsed:
+            return parsed
+    return {}
+
+# Selectores del detalle como constantes de módulo (no se reconstruyen
+# por llamada y quedan a la vista para mantenerlos)
+SEL_TITLE       = "h1, h1[itemprop='name'], [data-e2e='product-title']"
+SEL_PRICE       = "[data-e2e='product-price'], [itemprop='price'], .MoneyAmount__amount, .price"
+SEL_DESCRIPTION = "[data-e2e='product-description'], [itemprop='description'], .description, [data-testid='product-detail-description']"
+SEL_IMAGE       = "img[itemprop='image'], .swiper img, .product-image img, .Image__img, img[fetchpriority]"
+SEL_CATEGORY    = "a[href*='/categoria/'], [data-e2e='product-category']"
+SEL_LOCATION    = "[data-e2e='product-location'], .location, [data-testid='product-detail-location']"
+
+# Un solo evaluate por item recoge todos los campos por selector: antes
+# eran ~10 viajes CDP (query + inner_text / get_attribute por campo),
+# ahora uno; y solo se ejecuta si el JSON-LD no resolvió el item. Los
+# campos "text=Estado/Marca" del motor de selectores se emulan con byText.
+_EXTRACT_JS = """() => {
+  const q = s => document.querySelector(s);
+  const txt = el => el ? (el.innerText || el.textContent || '').trim() : '';
+  const byText = needle => {
+    for (const el of document.querySelectorAll('dt, span, div, p')) {
+      const t = (el.textContent || '').trim();
+      if (t.startsWith(needle) && t.length < 120) return t;
+    }
+    return '';
+  };
+  const img = q("%s");
+  return {
+    title: txt(q("%s")),
+    price_raw: txt(q("%s")),
+    description: txt(q("%s")),
+    image: img ? (img.getAttribute('src') || '') : '',
+    condition: byText('Estado') || byText('Condición'),
+    brand: byText('Marca'),
+    category: txt(q("%s")),
+    location: txt(q("%s")),
+  };
+}""" % (SEL_IMAGE, SEL_TITLE, SEL_PRICE, SEL_DESCRIPTION, SEL_CATEGORY, SEL_LOCATION)
+
+def _fields_from_bundle(bundle: Dict[str, Any]) -> Dict[str, Any]:
     data: Dict[str, Any] = {}
-
-    def safe_text(selector: str, timeout=2500) -> str:
-        try:
-            el = page.wait_for_selector(selector, timeout=timeout)
-            return (el.inner_text() or "").strip()
-        except Exception:
-            return ""
-
-    def safe_attr(selector: str, attr: str, timeout=2500) -> str:
-        try:
-            el = page.wait_for_selector(selector, timeout=timeout)
-            return (el.get_attribute(attr) or "").strip()
-        except Exception:
-            return ""
-
-    data["title"] = safe_text("h1, h1[itemprop='name'], [data-e2e='product-title']")
-    raw_price = safe_text("[data-e2e='product-price'], [itemprop='price'], .MoneyAmount__amount, .price")
-    price, currency = normalize_price(raw_price)
+    data["title"] = bundle.get("title", "")
+    price, currency = normalize_price(bundle.get("price_raw") or "")
     data["price"] = price
     data["currency"] = currency
-    data["description"] = safe_text("[data-e2e='product-description'], [itemprop='description'], .description, [data-testid='product-detail-description']")
-    data["image"] = safe_attr("img[itemprop='image'], .swiper img, .product-image img, .Image__img, img[fetchpriority]", "src")
-    # Campos opcionales (pueden no existir en Wallapop)
-    data["condition"] = safe_text("text=Estado") or safe_text("text=Condición")
-    data["brand"] = safe_text("text=Marca")
-    data["category"] = safe_text("a[href*='/categoria/'], [data-e2e='product-category']")
-    data["location"] = safe_text("[data-e2e='product-location'], .location, [data-testid='product-detail-location']")
+    for k in ("description", "image", "condition", "brand", "category", "location"):
+        data[k] = bundle.get(k, "")
     return data
 
-def fetch_item_detail(page, url: str, seller_name: str, seller_url: str) -> Dict[str, Any]:
-    try:
-        page.goto(url, wait_until="domcontentloaded", timeout=30000)
-    except PlaywrightTimeoutError:
-        # Reintento rápido
-        page.goto(url, wait_until="domcontentloaded", timeout=30000)
-
-    # Captura JSON-LD si existe
+def fetch_item_detail(page, url: str, seller_name: str, seller_url: str,
+                      run_ts: str) -> Dict[str, Any]:
+    # Camino rápido: GET plano con las cookies del contexto + lxml.
+    # El JSON-LD viene en el HTML estático, así que renderizar con
+    # Chromium solo hace falta cuando este camino no lo encuentra.
     parsed: Dict[str, Any] = {}
     try:
-        els = page.query_selector_all('script[type="application/ld+json"]')
-        for el in els or []:
-            txt = el.text_content()
-            if not txt:
-                continue
-            parsed = parse_json_ld(txt)
-            if parsed:
-                break
+        resp = page.context.request.get(url, timeout=15000)
+        if resp.ok:
+            parsed = _jsonld_from_html(resp.text())
     except Exception:
-        pass
+        parsed = {}
 
-    # Fallback por selectores
     if not parsed or not parsed.get("title"):
-        sel_parsed = extract_with_selectors(page)
-        parsed = {**sel_parsed, **parsed} if parsed else sel_parsed
+        try:
+            # El timeout de navegación del contexto (5 s) acota la espera;
+            # si expira seguimos con el DOM que haya llegado, que para el
+            # JSON-LD (HTML inicial) suele bastar
+            page.goto(url, wait_until="domcontentloaded")
+        except PlaywrightTimeoutError:
+            pass
+
+        # JSON-LD del DOM renderizado: un page.content() + xpath de lxml
+        # (mismo helper que el camino rápido) en vez de ir script a script
+        try:
+            parsed = _jsonld_from_html(page.content())
+        except Exception:
+            parsed = {}
+
+        # Fallback por selectores: un único evaluate, solo si hace falta
+        if not parsed or not parsed.get("title"):
+            try:
+                bundle = page.evaluate(_EXTRACT_JS) or {}
+            except Exception:
+                bundle = {}
+            sel_parsed = _fields_from_bundle(bundle)
+            parsed = {**sel_parsed, **parsed} if parsed else sel_parsed
 
     # ID desde URL si no vino
     item_id = parsed.get("id") or ""
@@ -242,7 +348,7 @@ def fetch_item_detail(page, url: str, seller_name: str, seller_url: str) -> Dict
     parsed["url"] = parsed.get("url") or url
     parsed["seller_name"] = seller_name
     parsed["seller_url"] = seller_url
-    parsed["timestamp_utc"] = datetime.utcnow().isoformat()
+    parsed["timestamp_utc"] = run_ts
 
     # Normaliza todas las columnas
     row = {k: parsed.get(k, "") for k in HEADERS}
@@ -263,7 +369,7 @@ def collect_profile_item_urls(page, profile_url: str):
     seller_url = profile_url
 
     # Scroll infinito hasta estabilizar
-    seen = set()
+    seen: Dict[str, str] = {}   # url -> huella de la tarjeta
     stable_rounds = 0
     last_count = 0
     MAX_ROUNDS = 80
@@ -275,21 +381,47 @@ def collect_profile_item_urls(page, profile_url: str):
         except Exception:
             pass
 
+        prev_h = page.evaluate("document.body.scrollHeight")
         page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-        time.sleep(0.8)
+        try:
+            # Espera dirigida por eventos: seguimos en cuanto crece la
+            # página, en vez de pagar 0.8 s fijos por ronda
+            page.wait_for_function("h => document.body.scrollHeight !== h",
+                                   arg=prev_h, timeout=3000)
+        except PlaywrightTimeoutError:
+            # La altura no creció: o fin del perfil (lo confirma el
+            # contador de estabilidad) o carga lenta; no esperamos más
+            pass
+        try:
+            page.wait_for_load_state("networkidle", timeout=2000)
+        except Exception:
+            pass
 
         try:
-            urls = page.evaluate("""() => {
-                const anchors = Array.from(document.querySelectorAll(
+            # Dedupe en el navegador (window.__seenUrls persiste entre
+            # evaluates): por CDP solo cruzan las tarjetas NUEVAS, con la
+            # huella precio|imagen que usa la caché para detectar cambios
+            cards = page.evaluate(r"""() => {
+                window.__seenUrls = window.__seenUrls || new Set();
+                const out = [];
+                const anchors = document.querySelectorAll(
                     'a[href*="/item/"], a[href*="/product/"], a[href*="/producto/"]'
-                ));
-                return anchors.map(a => new URL(a.getAttribute('href'), location.origin).href.split('?')[0]);
+                );
+                for (const a of anchors) {
+                    const url = new URL(a.getAttribute('href'), location.origin).href.split('?')[0];
+                    if (window.__seenUrls.has(url)) continue;
+                    window.__seenUrls.add(url);
+                    const img = a.querySelector('img');
+                    const m = (a.textContent || '').match(/\d[\d.,]*\s*€/);
+                    out.push([url, (m ? m[0] : '') + '|' + (img ? (img.getAttribute('src') || '') : '')]);
+                }
+                return out;
             }""")
         except Exception:
-            urls = []
+            cards = []
 
-        for u in urls:
-            seen.add(u)
+        for u, key in cards:
+            seen.setdefault(u, key)
 
         if len(seen) == last_count:
             stable_rounds += 1
@@ -300,42 +432,115 @@ def collect_profile_item_urls(page, profile_url: str):
         if stable_rounds >= 3:
             break
 
-    return seller_name, seller_url, sorted(seen)
+    return seller_name, seller_url, seen
 
 # ============ Main ============
-def run():
-    ws = get_sheet()
-    # Limpia solo nuestro bloque de columnas (A..end_col) desde la fila 2
-    write_headers_and_clear_data_block(ws)
+def _block_heavy_resources(context):
+    # Solo leemos texto/atributos del DOM: fuera fotos, fuentes y CSS
+    # (la mayoría de los bytes de cada goto) antes de navegar
+    context.route(
+        "**/*",
+        lambda route: route.abort()
+        if route.request.resource_type in {"image", "media", "font", "stylesheet"}
+        else route.continue_(),
+    )
 
-    rows: List[Dict[str, Any]] = []
+def _fetch_detail_shard(args) -> List[Tuple[str, Dict[str, Any]]]:
+    """Worker de proceso: un Chromium propio para su porción de URLs.
 
+    La API síncrona de Playwright no es thread-safe, así que el reparto
+    del detalle se hace por procesos (como recomienda upstream); cada
+    worker reutiliza una página para todas sus URLs.
+    """
+    urls, seller_name, seller_url, run_ts = args
+    pairs: List[Tuple[str, Dict[str, Any]]] = []
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=HEADLESS)
-        context = browser.new_context(
-            locale=PAGE_LOCALE,
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/124.0.0.0 Safari/537.36"
-            )
-        )
+        context = browser.new_context(locale=PAGE_LOCALE, user_agent=USER_AGENT,
+                                      storage_state=_storage_state())
+        _block_heavy_resources(context)
+        # Presupuesto corto por navegación: las páginas de item siguen
+        # cargando scripts de terceros mucho después de que el JSON-LD
+        # esté en el DOM; no los esperamos
+        context.set_default_navigation_timeout(5000)
         page = context.new_page()
-
-        seller_name, seller_url, item_urls = collect_profile_item_urls(page, WALLAPOP_PROFILE_URL)
-        print(f"Encontrados {len(item_urls)} items en el perfil.")
-
-        for idx, url in enumerate(item_urls, 1):
+        for idx, url in enumerate(urls, 1):
             try:
-                row = fetch_item_detail(page, url, seller_name, seller_url)
-                rows.append(row)
+                pairs.append((url, fetch_item_detail(page, url, seller_name, seller_url, run_ts)))
                 if idx % 30 == 0:
-                    print(f"[{idx}/{len(item_urls)}] Procesados 30 ítems…")
+                    print(f"[worker {os.getpid()}] {idx}/{len(urls)} ítems…")
             except Exception as e:
                 print(f"Error al procesar {url}: {e}")
+        context.close()
+        browser.close()
+    return pairs
+
+def run():
+    cache = _load_cache()
+    meta = cache.pop("__meta__", {})
+
+    ws = get_sheet()
+    # Limpia solo nuestro bloque de columnas (A..end_col) desde la fila 2;
+    # la fila 1 solo se reescribe si HEADERS o la hoja destino cambiaron
+    # desde el último run
+    stamp = _header_stamp(ws)
+    write_headers_and_clear_data_block(
+        ws, rewrite_header=meta.get("header_version") != stamp
+    )
 
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=HEADLESS)
+        context = browser.new_context(locale=PAGE_LOCALE, user_agent=USER_AGENT,
+                                      storage_state=_storage_state())
+        _block_heavy_resources(context)
+        page = context.new_page()
+        seller_name, seller_url, item_keys = collect_profile_item_urls(page, WALLAPOP_PROFILE_URL)
+        # Guarda cookies/estado: los workers del detalle y el próximo run
+        # arrancan ya "calientes"
+        context.storage_state(path=STATE_PATH)
         context.close()
         browser.close()
+    item_urls = sorted(item_keys)
+    print(f"Encontrados {len(item_urls)} items en el perfil.")
+
+    # Items cuya tarjeta no cambió desde el último run salen de la caché;
+    # huellas vacías ("|") no son de fiar y fuerzan el fetch
+    rows: List[Dict[str, Any]] = []
+    to_fetch: List[str] = []
+    for url in item_urls:
+        key = item_keys.get(url, "")
+        hit = cache.get(url)
+        if hit and key != "|" and hit.get("key") == key:
+            rows.append(hit["row"])
+        else:
+            to_fetch.append(url)
+    if rows:
+        print(f"{len(rows)} items sin cambios servidos desde caché.")
+
+    if to_fetch:
+        # Timestamp único del run: todos los items del mismo sync marcan
+        # la misma hora (y utcnow() está deprecado desde 3.12)
+        run_ts = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        # Reparto round-robin en K shards; el goto de cada item bloquea en
+        # red, así que K procesos dan un speedup casi lineal
+        shards = [to_fetch[i::DETAIL_WORKERS] for i in range(DETAIL_WORKERS)]
+        shards = [sh for sh in shards if sh]
+        args = [(sh, seller_name, seller_url, run_ts) for sh in shards]
+        if len(shards) == 1:
+            fetched = _fetch_detail_shard(args[0])
+        else:
+            fetched = []
+            with ProcessPoolExecutor(max_workers=len(shards)) as ex:
+                for shard_pairs in ex.map(_fetch_detail_shard, args):
+                    fetched.extend(shard_pairs)
+        for url, row in fetched:
+            cache[url] = {"key": item_keys.get(url, ""), "row": row}
+            rows.append(row)
+
+    # Poda URLs que ya no están en el perfil y persiste
+    pruned = {u: cache[u] for u in item_urls if u in cache}
+    pruned["__meta__"] = {"header_version": stamp}
+    _save_cache(pruned)
 
     if rows:
         write_rows(ws, rows)
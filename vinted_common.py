@@ -0,0 +1,57 @@
+# vinted_common.py
+# Helpers de precio/moneda compartidos por los scripts de Vinted.
+import re
+
+CURRENCY_MAP = {
+    "€": "EUR", "EUR": "EUR",
+    "$": "USD", "USD": "USD",
+    "£": "GBP", "GBP": "GBP",
+    "zł": "PLN", "PLN": "PLN",
+    "Kč": "CZK", "CZK": "CZK",
+    "Ft": "HUF", "HUF": "HUF",
+    "lei": "RON", "RON": "RON",
+    "CHF": "CHF",
+    "SEK": "SEK", "NOK": "NOK", "DKK": "DKK",
+}
+
+def default_currency_for_domain(domain: str) -> str:
+    # acepta host completo o solo TLD
+    d = (domain or "").split(".")[-1].lower()
+    return {
+        "es":"EUR","fr":"EUR","de":"EUR","it":"EUR","pt":"EUR","nl":"EUR","be":"EUR","ie":"EUR","lt":"EUR","lv":"EUR","ee":"EUR",
+        "pl":"PLN","cz":"CZK","hu":"HUF","ro":"RON",
+        "uk":"GBP","gb":"GBP",
+        "se":"SEK","dk":"DKK","no":"NOK",
+        "ch":"CHF",
+    }.get(d, "EUR")
+
+PRICE_PATTERNS = [
+    re.compile(r'(\d{1,3}(?:[.\s]\d{3})*(?:[.,]\d{1,2})?)\s*(€|EUR|\$|USD|£|GBP|zł|PLN|Kč|CZK|Ft|HUF|lei|RON|CHF|SEK|NOK|DKK)', re.I),
+    re.compile(r'(€|EUR|\$|USD|£|GBP|zł|PLN|Kč|CZK|Ft|HUF|lei|RON|CHF|SEK|NOK|DKK)\s*(\d{1,3}(?:[.\s]\d{3})*(?:[.,]\d{1,2})?)', re.I),
+]
+
+def parse_price_currency_from_text(text: str, domain_hint: str):
+    t = (text or "").replace("\xa0"," ").strip()
+    if not t:
+        return "", ""
+    for pat in PRICE_PATTERNS:
+        m = pat.search(t)
+        if m:
+            if len(m.groups()) == 2:
+                a, b = m.group(1), m.group(2)
+                if any(sym in a for sym in ("€","$","£")) or a.upper() in CURRENCY_MAP:
+                    curr_raw, val_raw = a, b
+                else:
+                    val_raw, curr_raw = a, b
+            else:
+                continue
+            val = val_raw.replace(" ", "").replace("\u202f","").replace(".", "").replace(",", ".")
+            try:
+                float(val)
+            except Exception:
+                pass
+            curr = CURRENCY_MAP.get(curr_raw, CURRENCY_MAP.get(curr_raw.upper(), ""))
+            if not curr:
+                curr = default_currency_for_domain(domain_hint)
+            return val, curr
+    return "", ""